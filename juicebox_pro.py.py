@@ -7,13 +7,46 @@
 # redistribution of this material is strictly forbidden.
 # =================================================================
 
+import logging
+import re
+from collections import deque, namedtuple
 import streamlit as st
 import streamlit.components.v1 as components
 import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, time, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from time import monotonic
+
+logger = logging.getLogger(__name__)
+
+_TICKER_SPLIT = re.compile(r"[,\s]+")
+
+# strategy labels resolve to int codes once per scan so the hot loops compare ints, not strings
+STRATEGIES = ["Deep ITM Covered Call", "Standard OTM Covered Call", "ATM Covered Call", "Cash Secured Put"]
+ITM_CALL, OTM_CALL, ATM_CALL, CSP = range(len(STRATEGIES))
+
+# adaptive scan concurrency: start narrow, widen/narrow by a step per window based on throughput
+START_WORKERS, WORKER_STEP, RATE_WINDOW_SEC = 8, 4, 2.0
+
+# a near-dated pick above this return is kept without fetching the later expirations
+EARLY_EXIT_RET = 10.0
+
+# the in-scan preview table is redrawn after this many new hits, not on every one
+PREVIEW_EVERY = 5
+
+# scan() returns one plain tuple per ticker in this order; the frame is built once from the records
+RESULT_COLS = ["Ticker", "RawT", "Price", "Strike", "Expiration", "OI", "Type", "Extrinsic", "Intrinsic",
+               "Total Prem", "Total Return %", "Contracts", "Total Juice", "Collateral"]
+# numeric columns are known up front, so the frame is cast once instead of inferred per rerun
+RESULT_DTYPES = {"Price": "float64", "Strike": "float64", "OI": "int64", "Extrinsic": "float64", "Intrinsic": "float64",
+                 "Total Prem": "float64", "Total Return %": "float64", "Contracts": "int64", "Total Juice": "float64",
+                 "Collateral": "float64"}
+
+# frozen snapshot of the sidebar settings handed to every scan worker
+ScanCtx = namedtuple("ScanCtx", "price_lo price_hi dte_lo dte_hi max_exp strat put_mode cushion acct goal etf_only f_sound")
 
 # -------------------------------------------------
 # 1. APP SETUP & STYLING
@@ -47,48 +80,33 @@ def get_market_status():
     is_open = is_weekday and (market_open <= current_time <= market_close)
     return is_open, now_et
 
+# --- banner runs before anything renders: one daily-bars request gives both today and the prior close ---
 @st.cache_data(ttl=300)
 def get_spy_condition():
     try:
-        spy = yf.Ticker("SPY")
-        hist = spy.history(period="1d")
-        if not hist.empty:
-            curr_price = hist["Close"].iloc[-1]
-            prev_close = spy.info.get('previousClose', curr_price)
+        hist = yf.Ticker("SPY").history(period="5d", interval="1d", auto_adjust=False)
+        closes = hist["Close"].dropna()
+        if not closes.empty:
+            curr_price = float(closes.iloc[-1])
+            prev_close = float(closes.iloc[-2]) if len(closes) > 1 else curr_price
             pct_change = ((curr_price - prev_close) / prev_close) * 100
             return curr_price, pct_change
-    except:
-        pass
+    except Exception as e:
+        logger.warning("SPY condition fetch failed: %s", e)
     return 0, 0
 
-@st.cache_data(ttl=30)
-def get_live_price(t):
-    try:
-        tk = yf.Ticker(t)
-        live_val = tk.info.get('regularMarketPrice')
-        if live_val:
-            return float(live_val)
-        hist = tk.history(period="1d", interval="1m")
-        if not hist.empty:
-            return float(hist["Close"].iloc[-1])
-    except:
-        pass
-    return None
-
-def mid_price(row):
-    bid, ask, lastp = row.get("bid"), row.get("ask"), row.get("lastPrice")
-    if pd.notna(bid) and pd.notna(ask) and ask > 0:
-        return (bid + ask) / 2
-    return float(lastp) if pd.notna(lastp) else 0
-
-# --- batch prices for big watchlists (200+ tickers) ---
+# --- works on whole chain columns: bid/ask midpoint, else last trade, else 0 ---
+def mid_price(bid, ask, lastp):
+    return np.where(~np.isnan(bid) & ~np.isnan(ask) & (ask > 0), (bid + ask) / 2, np.nan_to_num(lastp))
+
+# --- batch prices for big watchlists (200+ tickers); today's daily bar closes at the live price ---
 @st.cache_data(ttl=30)
 def get_live_prices_batch(tickers_list):
     try:
         df = yf.download(
             tickers=" ".join(tickers_list),
-            period="1d",
-            interval="1m",
+            period="2d",
+            interval="1d",
             group_by="ticker",
             threads=True,
             progress=False
@@ -102,24 +120,69 @@ def get_live_prices_batch(tickers_list):
                 try:
                     s = df[t]["Close"].dropna()
                     out[t] = float(s.iloc[-1]) if len(s) else None
-                except:
+                except KeyError:
                     out[t] = None
         else:
             s = df["Close"].dropna()
             out[tickers_list[0]] = float(s.iloc[-1]) if len(s) else None
 
         return out
-    except:
+    except Exception as e:
+        logger.warning("batch price download failed: %s", e)
         return {t: None for t in tickers_list}
 
-# --- cache info and only load when needed ---
-@st.cache_data(ttl=1800)
+# --- cache info and only load when needed; keep just the screening fields, they move on earnings/ratings ---
+INFO_FIELDS = ("quoteType", "trailingEps", "recommendationKey")
+
+@st.cache_data(ttl=timedelta(days=7))
+def _fetch_info_fields(t):
+    info = yf.Ticker(t).info
+    # yfinance hides quoteSummary errors and hands back a stub dict; raise so the stub isn't cached for a week
+    if not info or "quoteType" not in info:
+        raise ValueError("incomplete info response")
+    return {k: info[k] for k in INFO_FIELDS if k in info}
+
 def get_info_cached(t):
+    # errors and incomplete responses raise out of the cached function, so they are retried next scan
     try:
-        return yf.Ticker(t).info
-    except:
+        return _fetch_info_fields(t)
+    except Exception as e:
+        logger.warning("info fetch failed for %s: %s", t, e)
         return {}
 
+# --- option data is shared by every session on the server; _tk is the caller's Ticker (not hashed) ---
+# yahoo's undated options call returns the expiration list together with the nearest chain, keep both
+@st.cache_data(ttl=300)
+def get_front_chain(t, _tk):
+    chain = _tk.option_chain()
+    if chain.calls is None:
+        return (), None, None
+    return tuple(_tk.options), chain.calls, chain.puts
+
+# --- both sides are cached so switching strategy within the ttl reuses the fetch ---
+@st.cache_data(ttl=300)
+def get_chain(t, exp, _tk):
+    chain = _tk.option_chain(exp)
+    return chain.calls, chain.puts
+
+# --- chart widget html is a pure function of the symbol; identical html keeps the iframe alive ---
+@st.cache_data
+def tv_widget_html(symbol):
+    return f"""
+    <div id="tv" style="height:500px"></div>
+    <script src="https://s3.tradingview.com/tv.js"></script>
+    <script>
+    new TradingView.widget({{
+        "autosize": true, "symbol": "{symbol}", "interval": "D", "theme": "light", "container_id": "tv", "studies": ["BB@tv-basicstudies"]
+    }});
+    </script>
+    """
+
+# --- watchlist text only changes when edited; skip re-tokenizing it on every selection rerun ---
+@st.cache_data
+def parse_tickers(text):
+    return tuple(sorted({t.upper() for t in _TICKER_SPLIT.split(text) if t}))
+
 # -------------------------------------------------
 # 3. SIDEBAR
 # -------------------------------------------------
@@ -138,7 +201,7 @@ with st.sidebar:
 
     price_range = st.slider("Stock Price Range ($)", 1, 500, (2, 100), key="cfg_price_rng_v26")
     dte_range = st.slider("Days to Expiration (DTE)", 0, 45, (0, 14), key="cfg_dte_rng_v26")
-    strategy = st.selectbox("Strategy", ["Deep ITM Covered Call", "Standard OTM Covered Call", "ATM Covered Call", "Cash Secured Put"], key="cfg_strat_v26")
+    strategy = st.selectbox("Strategy", STRATEGIES, key="cfg_strat_v26")
 
     put_mode = "OTM"
     if strategy == "Cash Secured Put":
@@ -160,9 +223,11 @@ with st.sidebar:
     if advanced_perf:
         max_expirations = st.slider("Max expirations per ticker", 1, 8, 2, key="cfg_max_exp_v26")
         workers = st.slider("Workers", 5, 30, 20, key="cfg_workers_v26")
+        max_rows = st.slider("Result rows shown", 10, 200, 25, step=5, key="cfg_max_rows_v26")
     else:
         max_expirations = 2
         workers = 20
+        max_rows = 25
 
     # timeout stays visible (important)
     scan_timeout_sec = st.slider("Per-ticker timeout (sec)", 2, 25, 8, key="cfg_timeout_v26")
@@ -176,115 +241,153 @@ with st.sidebar:
         height=150,
         key="cfg_watchlist_v26"
     )
-    tickers = sorted({t.upper() for t in text.replace(",", " ").split() if t.strip()})
+    tickers = parse_tickers(text)
 
 # -------------------------------------------------
 # 4. SCANNER LOGIC
 # -------------------------------------------------
-def scan(t):
+# --- strike filter per strategy; df is ONE side of the chain (chain.calls or chain.puts) ---
+# never pass a calls+puts concat here. If a unified frame is ever needed, split it with
+# df["contractSymbol"].str[-9] == "P" (OCC type char) rather than the slower .str.startswith.
+def _select_contracts(df, strat, put_mode, price, cushion_val, is_put):
+    side = "P" if is_put else "C"
+    syms = df["contractSymbol"]
+    if len(syms) and (syms.iloc[0][-9] != side or syms.iloc[-1][-9] != side):
+        raise ValueError(f"expected {side} contracts only")
+
+    # positions of the candidate rows, straight off the strike array (no filtered frame copy)
+    strikes = df["strike"].to_numpy(dtype=np.float64)
+    if strat == ITM_CALL:
+        mask = strikes <= price * (1 - cushion_val / 100)
+    elif strat == OTM_CALL:
+        mask = strikes > price
+    elif strat == ATM_CALL:
+        above = np.where(strikes > price, strikes, np.inf)
+        if not len(above) or np.isinf(above.min()):
+            return np.empty(0, dtype=np.intp)
+        return np.array([int(above.argmin())])
+    elif put_mode == "OTM":
+        mask = strikes <= price
+    else:
+        mask = strikes >= price * (1 + cushion_val / 100)
+    return np.flatnonzero(mask)
+
+# --- score every contract of one chain side with column math, return the best affordable one ---
+def _best_contract(df, rows, strat, price, is_put, acct, goal_amt):
+    strikes = df["strike"].to_numpy(dtype=np.float64)[rows]
+
+    # one contract has to fit the account before any premium math is worth doing
+    coll = strikes * 100 if is_put else np.full(len(strikes), price * 100)
+    fits = coll <= acct
+    if not fits.any():
+        return None
+    keep = rows[fits]
+    strikes, coll = strikes[fits], coll[fits]
+
+    bid = df["bid"].to_numpy(dtype=np.float64, na_value=np.nan)[keep]
+    ask = df["ask"].to_numpy(dtype=np.float64, na_value=np.nan)[keep]
+    last = df["lastPrice"].to_numpy(dtype=np.float64, na_value=np.nan)[keep]
+    oi = df["openInterest"].to_numpy(dtype=np.float64, na_value=0)[keep]
+
+    mid = mid_price(bid, ask, last)
+    intrinsic = np.maximum(0, strikes - price) if is_put else np.maximum(0, price - strikes)
+    extrinsic = np.maximum(0, mid - intrinsic)
+
+    ok = (oi >= 500) & (mid > 0)
+    if strat == ATM_CALL:
+        juice = mid
+    else:
+        ok &= ~((intrinsic > 0) & (extrinsic <= 0.05))
+        juice = np.where(intrinsic > 0, extrinsic, mid)
+
+    juice_con = juice * 100
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total_ret = juice_con / coll * 100
+        needed = np.maximum(1, np.ceil(goal_amt / juice_con))
+    ok &= needed * coll <= acct
+    if not ok.any():
+        return None
+
+    i = int(np.argmax(np.where(ok, total_ret, -np.inf)))
+    return (float(strikes[i]), int(oi[i]), float(mid[i]), float(intrinsic[i]), float(extrinsic[i]),
+            float(juice_con[i]), float(total_ret[i]), int(needed[i]), float(coll[i]))
+
+def scan(t, *, ctx, price_map):
     try:
         tk = yf.Ticker(t)
 
-        # price first (batch map), before any info/options work
-        price = st.session_state.get("price_map", {}).get(t) or get_live_price(t)
-        if not price or not (price_range[0] <= price <= price_range[1]):
+        # price comes only from the batch map; tickers it missed were never made eligible
+        price = price_map.get(t)
+        if not price or not (ctx.price_lo <= price <= ctx.price_hi):
+            return None
+
+        strat = ctx.strat
+        is_put = strat == CSP
+        # covered calls need 100 shares; if one lot doesn't fit the account, skip the chain fetch
+        if not is_put and price * 100 > ctx.acct:
             return None
 
-        # only pull info if needed (ETF-only or fundamentals)
+        # info fields are cached for days while chains only last minutes, so reject on them
+        # before the front chain download rather than after it
         q_type = 'EQUITY'
-        info = None
-        if etf_only or f_sound:
+        if ctx.etf_only or ctx.f_sound:
             info = get_info_cached(t)
             q_type = info.get('quoteType', 'EQUITY')
-            if etf_only and q_type != 'ETF':
+            if ctx.etf_only and q_type != 'ETF':
                 return None
 
-        if f_sound:
-            if info is None:
-                info = get_info_cached(t)
+        if ctx.f_sound:
             if info.get('trailingEps', -1) <= 0:
                 return None
             if info.get('recommendationKey') not in ['buy', 'strong_buy', 'hold']:
                 return None
 
-        if not tk.options:
+        exps, front_calls, front_puts = get_front_chain(t, tk)
+        if not exps:
             return None
 
-        today = datetime.now()
-
-        # filter expirations by DTE then cap how many we scan
-        valid_exps = []
-        for exp in tk.options:
-            try:
-                exp_dte = (datetime.strptime(exp, "%Y-%m-%d") - today).days
-            except:
-                continue
-            if dte_range[0] <= exp_dte <= dte_range[1]:
-                valid_exps.append((exp_dte, exp))
-
-        if not valid_exps:
+        # filter expirations by DTE then cap how many we scan; yahoo dates are ISO, so parse them in one go.
+        # -1 keeps the old strptime(exp) - now() count: whole days left before the expiry's midnight
+        exp_days = np.array(exps, dtype="datetime64[D]")
+        dte = (exp_days - np.datetime64(datetime.now().date(), "D")).astype(np.int64) - 1
+        keep = np.flatnonzero((dte >= ctx.dte_lo) & (dte <= ctx.dte_hi))
+        if not keep.size:
             return None
 
-        valid_exps.sort(key=lambda x: x[0])
-        valid_exps = valid_exps[:max_expirations]
-
-        best = None
-        for exp_dte, exp in valid_exps:
-            chain = tk.option_chain(exp)
-            is_put = strategy == "Cash Secured Put"
-            df = chain.puts if is_put else chain.calls
-
-            if strategy == "Deep ITM Covered Call":
-                df = df[df["strike"] <= price * (1 - cushion_val / 100)]
-            elif strategy == "Standard OTM Covered Call":
-                df = df[df["strike"] > price]
-            elif strategy == "ATM Covered Call":
-                df = df[df["strike"] > price].sort_values("strike").head(1)
-            elif strategy == "Cash Secured Put":
-                if put_mode == "OTM":
-                    df = df[df["strike"] <= price]
-                else:
-                    df = df[df["strike"] >= price * (1 + cushion_val / 100)]
-
-            for _, row in df.iterrows():
-                strike, total_prem = row["strike"], mid_price(row)
-                open_int = row.get("openInterest", 0)
-                if open_int < 500 or total_prem <= 0:
-                    continue
-
-                intrinsic = max(0, price - strike) if not is_put else max(0, strike - price)
-                extrinsic = max(0, total_prem - intrinsic)
-
-                if strategy == "ATM Covered Call":
-                    juice_val = total_prem
-                else:
-                    if intrinsic > 0 and extrinsic <= 0.05:
-                        continue
-                    juice_val = extrinsic if intrinsic > 0 else total_prem
-
-                juice_con = juice_val * 100
-                coll_con = strike * 100 if is_put else price * 100
-                total_ret = (juice_con / coll_con) * 100
+        keep = keep[np.argsort(dte[keep], kind="stable")][:ctx.max_exp]
+        valid_exps = [exps[i] for i in keep]
 
-                needed = max(1, int(np.ceil(goal_amt / juice_con)))
-                if (needed * coll_con) > acct:
-                    continue
+        best, best_ret = None, None
+        for exp in valid_exps:
+            if exp == exps[0]:
+                calls, puts = front_calls, front_puts
+            else:
+                calls, puts = get_chain(t, exp, tk)
+            df = puts if is_put else calls
 
-                goal_met_icon = " 🎯" if juice_con >= goal_amt else ""
-
-                res = {
-                    "Ticker": f"{t}{goal_met_icon}", "RawT": t, "Grade": "🟢 A" if total_ret > 5 else "🟡 B",
-                    "Price": round(price, 2), "Strike": round(strike, 2), "Expiration": exp, "OI": int(open_int),
-                    "Type": q_type, "Extrinsic": round(extrinsic * 100, 2), "Intrinsic": round(intrinsic * 100, 2),
-                    "Total Prem": round(total_prem * 100, 2), "Total Return %": round(total_ret, 2),
-                    "Contracts": needed, "Total Juice": round(juice_con * needed, 2),
-                    "Collateral": round(needed * coll_con, 0)
-                }
-                if not best or total_ret > best["Total Return %"]:
-                    best = res
+            rows = _select_contracts(df, strat, ctx.put_mode, price, ctx.cushion, is_put)
+            pick = _best_contract(df, rows, strat, price, is_put, ctx.acct, ctx.goal)
+            if pick is None:
+                continue
+            strike, open_int, total_prem, intrinsic, extrinsic, juice_con, total_ret, needed, coll_con = pick
+
+            goal_met_icon = " 🎯" if juice_con >= ctx.goal else ""
+
+            if best is None or total_ret > best_ret:
+                best_ret = total_ret
+                best = (
+                    f"{t}{goal_met_icon}", t, round(price, 2), round(strike, 2), exp, open_int,
+                    q_type, round(extrinsic * 100, 2), round(intrinsic * 100, 2),
+                    round(total_prem * 100, 2), round(total_ret, 2),
+                    needed, round(juice_con * needed, 2),
+                    round(needed * coll_con, 0)
+                )
+            if best_ret > EARLY_EXIT_RET:
+                break
 
         return best
-    except:
+    except Exception as e:
+        logger.warning("scan failed for %s: %s", t, e)
         return None
 
 # -------------------------------------------------
@@ -300,65 +403,135 @@ st.markdown(f"""<div class="market-banner {'market-open' if is_open else 'market
 if st.button("RUN LIVE SCAN ⚡", use_container_width=True, key="main_scan_btn_v26"):
     with st.spinner("Scanning for opportunities..."):
 
-        # batch prices first
-        st.session_state.price_map = get_live_prices_batch(tickers)
+        # batch prices first; workers get the map directly (no session_state from threads)
+        price_map = get_live_prices_batch(tickers)
 
-        # only scan tickers with valid price in range
+        # only scan tickers with valid price in range (and, for calls, one affordable lot),
+        # so impossible names never take a worker slot or touch options
+        calls_mode = strategy != STRATEGIES[CSP]
         eligible = [
             t for t in tickers
-            if (st.session_state.price_map.get(t) is not None)
-            and (price_range[0] <= st.session_state.price_map.get(t) <= price_range[1])
+            if (price_map.get(t) is not None)
+            and (price_range[0] <= price_map.get(t) <= price_range[1])
+            and not (calls_mode and price_map.get(t) * 100 > acct)
         ]
         st.write(f"Eligible tickers by price: {len(eligible)} / {len(tickers)}")
 
         progress = st.progress(0)
+        preview = st.empty()
+        shown = 0
         results = []
         timed_out = 0
         total = len(eligible)
 
-        with ThreadPoolExecutor(max_workers=workers) as ex:
-            futures = {ex.submit(scan, t): t for t in eligible}
-
-            done_count = 0
-            for fut in as_completed(futures):
-                try:
-                    r = fut.result(timeout=scan_timeout_sec)
-                    if r is not None:
-                        results.append(r)
-                except TimeoutError:
-                    timed_out += 1
-                except Exception:
-                    pass
-
-                done_count += 1
-                if total > 0 and (done_count % 5 == 0 or done_count == total):
+        # no point in idle threads when the eligible list is shorter than the worker setting
+        pool_size = max(1, min(workers, total))
+        ex = ThreadPoolExecutor(max_workers=pool_size)
+        ctx = ScanCtx(price_range[0], price_range[1], dte_range[0], dte_range[1], max_expirations,
+                      STRATEGIES.index(strategy), put_mode, cushion_val, acct, goal_amt, etf_only, f_sound)
+        scan_one = partial(scan, ctx=ctx, price_map=price_map)
+
+        # the per-ticker clock starts when a worker picks the ticker up, not when it is queued
+        started = {}
+        def timed_scan(t):
+            started[t] = monotonic()
+            return scan_one(t)
+
+        # yahoo's latency swings a lot: the worker setting is the ceiling, the in-flight limit
+        # follows observed throughput (up a step while it improves, down a step when it drops)
+        pending = deque(eligible)
+        inflight = {}
+        # timed-out futures whose thread is still stuck on yahoo; they hold a pool slot until they return
+        abandoned = set()
+        limit = min(START_WORKERS, pool_size)
+        last_rate = 0.0
+        window_start, window_done = monotonic(), 0
+        done_count = 0
+        try:
+            while True:
+                abandoned = {fut for fut in abandoned if not fut.done()}
+                free = min(limit, pool_size - len(abandoned))
+                while pending and len(inflight) < free:
+                    t = pending.popleft()
+                    inflight[ex.submit(timed_scan, t)] = t
+                if not inflight and not pending:
+                    break
+
+                finished, _ = wait(inflight.keys() | abandoned, timeout=0.25, return_when=FIRST_COMPLETED)
+                now = monotonic()
+                for fut in finished:
+                    if fut not in inflight:
+                        # an abandoned worker came back; its slot frees up at the top of the loop
+                        continue
+                    del inflight[fut]
+                    try:
+                        r = fut.result()
+                        if r is not None:
+                            results.append(r)
+                    except Exception:
+                        pass
+                    done_count += 1
+                    window_done += 1
+
+                # per-ticker timeout: stop waiting on stragglers and move on; only running tickers count
+                for fut, t in list(inflight.items()):
+                    if t in started and now - started[t] > scan_timeout_sec:
+                        del inflight[fut]
+                        abandoned.add(fut)
+                        timed_out += 1
+                        done_count += 1
+
+                if now - window_start >= RATE_WINDOW_SEC:
+                    rate = window_done / (now - window_start)
+                    if rate > last_rate * 1.05:
+                        limit = min(pool_size, limit + WORKER_STEP)
+                    elif rate < last_rate * 0.95:
+                        limit = max(WORKER_STEP, limit - WORKER_STEP)
+                    last_rate, window_start, window_done = rate, now, 0
+
+                if total > 0 and finished:
                     progress.progress(done_count / total)
 
+                # running best-so-far while slow tickers are still out; results_panel() replaces it at the end
+                if len(results) - shown >= PREVIEW_EVERY:
+                    shown = len(results)
+                    live = pd.DataFrame.from_records(results, columns=RESULT_COLS)
+                    live = live.iloc[np.argsort(-live["Total Return %"].to_numpy(), kind="stable")].head(max_rows)
+                    preview.dataframe(live[["Ticker", "Type", "Price", "Strike", "Expiration", "Total Return %"]],
+                                      use_container_width=True, hide_index=True)
+        finally:
+            # don't let a hung yahoo request hold the page; queued tickers are cancelled
+            ex.shutdown(wait=False, cancel_futures=True)
+            preview.empty()
+
         st.session_state.results = results
         st.session_state.timed_out = timed_out
 
-if "results" in st.session_state:
-    df = pd.DataFrame(st.session_state.results)
+# --- results + detail view rerun on their own; row clicks skip the sidebar/banner/scan script ---
+@st.fragment
+def results_panel():
+    if "results" not in st.session_state:
+        return
+
+    df = pd.DataFrame.from_records(st.session_state.results, columns=RESULT_COLS).astype(RESULT_DTYPES)
     if not df.empty:
-        df = df.sort_values("Total Return %", ascending=False)
+        # grade is a step function of return, so one argsort on the float column gives the full order
+        ret = df["Total Return %"].to_numpy()
+        df["Grade"] = np.where(ret > 5, "🟢 A", "🟡 B")
+        df = df.iloc[np.argsort(-ret, kind="stable")]
         cols = ["Ticker", "Type", "Grade", "Price", "Strike", "Expiration", "OI", "Extrinsic", "Intrinsic", "Total Prem", "Total Return %"]
-        sel = st.dataframe(df[cols], use_container_width=True, hide_index=True, selection_mode="single-row", on_select="rerun", key="main_results_df_v26")
+        # only the top slice goes over the wire; df is sorted, so positions line up with the table
+        top = df.head(max_rows)
+        sel = st.dataframe(top[cols], use_container_width=True, hide_index=True, selection_mode="single-row", on_select="rerun", key="main_results_df_v26")
+        if len(df) > len(top):
+            st.caption(f"Showing top {len(top)} of {len(df)} by Total Return %")
 
         if sel.selection.rows:
-            r = df.iloc[sel.selection.rows[0]]
+            r = top.iloc[sel.selection.rows[0]]
             st.divider()
             c1, c2 = st.columns([2, 1])
             with c1:
-                tv_html = f"""
-                <div id="tv" style="height:500px"></div>
-                <script src="https://s3.tradingview.com/tv.js"></script>
-                <script>
-                new TradingView.widget({{
-                    "autosize": true, "symbol": "{r['RawT']}", "interval": "D", "theme": "light", "container_id": "tv", "studies": ["BB@tv-basicstudies"]
-                }});
-                </script>
-                """
-                components.html(tv_html, height=510)
+                components.html(tv_widget_html(r['RawT']), height=510)
             with c2:
                 g = r["Grade"][-1].lower()
                 card_html = f"""<div class="card">
@@ -379,4 +552,6 @@ if "results" in st.session_state:
     if "timed_out" in st.session_state and st.session_state.timed_out:
         st.caption(f"Timed out tickers (skipped): {st.session_state.timed_out}")
 
+results_panel()
+
 st.markdown("""<div class="disclaimer"><b>LEGAL NOTICE:</b> JuiceBox Pro™ owned by <b>Bucforty LLC</b>. Information is for educational purposes only.</div>""", unsafe_allow_html=True)